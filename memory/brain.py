@@ -1,16 +1,35 @@
 from minivectordb.sharded_vector_database import ShardedVectorDatabase
 from memory.compression import compress_text, structurize_text
-from memory.embeddings import extract_embeddings
-import uuid, sqlite3, numpy as np, threading
-from datetime import datetime
-
-dummy_embedding = np.zeros(512, dtype=np.float32)
+from memory.embeddings import EmbeddingBackend, get_embedding_backend
+from memory import snapshot
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+import uuid, sqlite3, numpy as np, threading, heapq, os
+from datetime import datetime, timezone
+
+def to_timestamp(value):
+    """
+    Converts a datetime (or an ISO 8601 string) into the text format chat_sessions timestamps are stored in.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        raise TypeError(f"Expected a datetime or an ISO 8601 string, got {type(value).__name__}")
+
+    # Timestamps are stored as naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return value.isoformat(' ')
+
+VectorStoreState = namedtuple('VectorStoreState', ['lock', 'embeddings', 'metadata', 'unique_ids', 'embedding_size'])
 
 class Memory:
     def __init__(
             self,
             sqlite_db_path: str = './memory.db',
-            vector_db_storage_folder_location: str = 'memory_shards'
+            vector_db_storage_folder_location: str = 'memory_shards',
+            embedding_backend: EmbeddingBackend = None
         ):
         """
         Initializes a new instance of the class.
@@ -18,10 +37,13 @@ class Memory:
         Args with defaults:
         - sqlite_db_path: The path to the SQLite database file.
         - vector_db_storage_location: The location where the vector database will be stored.
+        - embedding_backend: The backend used to extract embeddings (defaults to the process-wide one).
         """
         self.vector_db_storage_folder_location = vector_db_storage_folder_location
         self.vector_db = ShardedVectorDatabase(storage_dir=vector_db_storage_folder_location)
         self.sqlite_db_path = sqlite_db_path
+        self.embedding_backend = embedding_backend if embedding_backend is not None else get_embedding_backend()
+        self.dummy_embedding = np.zeros(self.embedding_backend.embedding_size, dtype=np.float32)
         self.lock = threading.Lock()
 
         self.init_db()
@@ -55,7 +77,7 @@ class Memory:
             
     def store_embeddings(self, sentences, session_id, message_id, type):
         unique_ids = [str(uuid.uuid4()) for _ in range(len(sentences))]
-        embeddings = [extract_embeddings(sentence) for sentence in sentences]
+        embeddings = self.embedding_backend.extract_embeddings_batch(sentences)
         metadatas = [
             {
                 'sentence': sentence,
@@ -73,10 +95,10 @@ class Memory:
             session_id = str(uuid.uuid4())
 
         question_id = str(uuid.uuid4())
-        question_summary = compress_text(question)
+        question_summary = compress_text(question, self.embedding_backend)
 
         answer_id = str(uuid.uuid4())
-        answer_summary = compress_text(answer)
+        answer_summary = compress_text(answer, self.embedding_backend)
 
         with self.lock:
             with sqlite3.connect(self.sqlite_db_path) as db_conn:
@@ -128,7 +150,7 @@ class Memory:
         last_n_messages_ids = [ m['message_id'] for m in last_n_messages ]
 
         # Get embeddings for the incoming prompt
-        prompt_embedding = extract_embeddings(new_prompt)
+        prompt_embedding = self.embedding_backend.extract_embeddings(new_prompt)
 
         # Search in vector database for the most similar question
         # (Excluding the last "N" messages, as they are fetched directly from the database)
@@ -161,9 +183,182 @@ class Memory:
             "suggested_context": suggested_context.strip()
         }
 
+    def _vector_store_state(self, normalize=False):
+        """
+        Reads the in-memory state of the vector store, which minivectordb does not expose publicly.
+        This is the only place relying on its internals (search, export_sessions and import_snapshot go through it).
+
+        Returns the store lock, the embeddings array, and copies of the metadata and unique id lists.
+        With `normalize`, pending vectors are normalized first by rebuilding the index, as find_most_similar does.
+        """
+        vector_db = self.vector_db
+        required = ['lock', 'embeddings', 'metadata', 'unique_ids', 'embedding_size', '_embeddings_changed', '_build_index']
+        missing = [ attribute for attribute in required if not hasattr(vector_db, attribute) ]
+        if missing:
+            raise RuntimeError(
+                f"Unsupported minivectordb version: ShardedVectorDatabase has no {', '.join(missing)} "
+                "(needed by search, export_sessions and import_snapshot)."
+            )
+
+        with vector_db.lock:
+            if normalize and vector_db._embeddings_changed:
+                vector_db._build_index()
+            return VectorStoreState(
+                vector_db.lock,
+                vector_db.embeddings,
+                list(vector_db.metadata),
+                list(vector_db.unique_ids),
+                vector_db.embedding_size
+            )
+
+    def _message_ids_in_time_range(self, session_ids, start_time, end_time):
+        conditions, params = [], []
+        if start_time is not None:
+            conditions.append('timestamp >= ?')
+            params.append(to_timestamp(start_time))
+        if end_time is not None:
+            conditions.append('timestamp <= ?')
+            params.append(to_timestamp(end_time))
+
+        # Keep the IN clause under SQLite's bound parameter limit
+        session_chunks = [ session_ids[i:i + 500] for i in range(0, len(session_ids), 500) ] if session_ids is not None else [None]
+
+        message_ids = set()
+        with self.lock:
+            with sqlite3.connect(self.sqlite_db_path) as db_conn:
+                cursor = db_conn.cursor()
+                for chunk in session_chunks:
+                    chunk_conditions, chunk_params = list(conditions), list(params)
+                    if chunk is not None:
+                        chunk_conditions.append(f"session_id IN ({', '.join('?' for _ in chunk)})")
+                        chunk_params.extend(chunk)
+                    cursor.execute(f'SELECT message_id FROM chat_sessions WHERE {" AND ".join(chunk_conditions)}', chunk_params)
+                    message_ids.update(row[0] for row in cursor)
+        return message_ids
+
+    def search(self, query, scope=None, k=10, types=None, start_time=None, end_time=None, workers=None):
+        """
+        Searches the long-term memory across sessions.
+
+        The stored vectors are split into partitions that are scored on a thread pool.
+        Each partition keeps its own top-k, and the partial results are merged at the end.
+        Filters are applied before scoring, and the matching chat_sessions rows are fetched in a single query.
+
+        Args with defaults:
+        - scope: A session id, a list of session ids, or None to search every session.
+        - k: The number of results to return.
+        - types: 'question', 'answer' or a list of them. None returns both.
+        - start_time / end_time: Only consider messages stored within this time range (datetimes or ISO 8601 strings, naive values are UTC).
+        - workers: The number of threads used to score the partitions (defaults to the CPU count).
+        """
+        if isinstance(scope, str):
+            scope = [scope]
+        elif scope is not None:
+            scope = list(scope)
+        if isinstance(types, str):
+            types = [types]
+
+        if k <= 0 or (scope is not None and len(scope) == 0):
+            return []
+
+        # Time ranges live in chat_sessions, so resolve them into message ids up front
+        message_ids = None
+        if start_time is not None or end_time is not None:
+            message_ids = self._message_ids_in_time_range(scope, start_time, end_time)
+            if not message_ids:
+                return []
+
+        # Stored vectors are normalized first, so scoring is a plain dot product
+        state = self._vector_store_state(normalize=True)
+        embeddings, metadata = state.embeddings, state.metadata
+        if embeddings is None or embeddings.shape[0] == 0:
+            return []
+
+        query_embedding = np.asarray(self.embedding_backend.extract_embeddings(query), dtype=np.float32)
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+
+        # Filters are evaluated once per query into a boolean mask, shared by every partition
+        mask = None
+        if scope is not None or types is not None or message_ids is not None:
+            scope_set = set(scope) if scope is not None else None
+            types_set = set(types) if types is not None else None
+            mask = np.fromiter(
+                (
+                    (scope_set is None or m.get('session_id') in scope_set)
+                    and (types_set is None or m.get('type') in types_set)
+                    and (message_ids is None or m.get('message_id') in message_ids)
+                    for m in metadata
+                ),
+                dtype=bool, count=len(metadata)
+            )
+            if not mask.any():
+                return []
+            if mask.all():
+                mask = None
+
+        def search_partition(start, end):
+            if mask is None:
+                # No copy, the partition is a view on the stored vectors
+                vectors, positions = embeddings[start:end], None
+            else:
+                positions = np.flatnonzero(mask[start:end]) + start
+                if len(positions) == 0:
+                    return []
+                vectors = embeddings[positions] if len(positions) < end - start else embeddings[start:end]
+
+            scores = vectors @ query_embedding
+
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(scores))
+            return [ (float(scores[i]), int(positions[i]) if positions is not None else start + int(i)) for i in top ]
+
+        total = len(metadata)
+        workers = workers or os.cpu_count() or 1
+        partition_size = max(2048, -(-total // workers))
+        partitions = [ (start, min(start + partition_size, total)) for start in range(0, total, partition_size) ]
+
+        if len(partitions) == 1:
+            partial_results = [search_partition(*partitions[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(partitions))) as executor:
+                partial_results = list(executor.map(lambda partition: search_partition(*partition), partitions))
+
+        best = heapq.nlargest(k, (hit for hits in partial_results for hit in hits))
+        if not best:
+            return []
+
+        # Join the hits back to their chat_sessions rows in one query (per 500 messages)
+        columns = ['session_id', 'message_id', 'question', 'question_summary', 'answer', 'answer_summary', 'timestamp']
+        hit_message_ids = list({ metadata[position]['message_id'] for _, position in best })
+        rows = {}
+        with self.lock:
+            with sqlite3.connect(self.sqlite_db_path) as db_conn:
+                cursor = db_conn.cursor()
+                for start in range(0, len(hit_message_ids), 500):
+                    chunk = hit_message_ids[start:start + 500]
+                    cursor.execute(f'''
+                        SELECT * FROM chat_sessions
+                        WHERE message_id IN ({', '.join('?' for _ in chunk)})
+                    ''', chunk)
+                    rows.update({ row[1]: dict(zip(columns, row)) for row in cursor.fetchall() })
+
+        return [
+            {
+                'score': score,
+                'sentence': metadata[position]['sentence'],
+                'session_id': metadata[position]['session_id'],
+                'message_id': metadata[position]['message_id'],
+                'type': metadata[position]['type'],
+                'message': rows.get(metadata[position]['message_id'])
+            }
+            for score, position in best
+        ]
+
     def delete_session_from_vector_db(self, session_id):
         ids, _, _ = self.vector_db.find_most_similar(
-            dummy_embedding,
+            self.dummy_embedding,
             metadata_filter={'session_id': session_id},
             k=9999
         )
@@ -172,7 +367,7 @@ class Memory:
 
     def delete_message_from_vector_db(self, session_id, message_id):
         ids, _, _ = self.vector_db.find_most_similar(
-            dummy_embedding,
+            self.dummy_embedding,
             metadata_filter={'session_id': session_id, 'message_id': message_id},
             k=2
         )
@@ -222,3 +417,128 @@ class Memory:
                     # Convert to dictionary format
                     columns = ['session_id', 'message_id', 'question', 'question_summary', 'answer', 'answer_summary', 'timestamp']
                     return [dict(zip(columns, message)) for message in messages]
+
+    def export_sessions(self, session_ids, path, batch_size=5000):
+        """
+        Exports the given sessions into a snapshot folder, which can be restored with `import_snapshot`.
+
+        The snapshot contains the stored vectors as a single .npy block, plus the vector metadata
+        and the chat_sessions rows as gzip-compressed JSON lines. Everything is streamed in batches.
+
+        The snapshot is not point-in-time consistent: vectors and rows are read one after the other,
+        so sessions that are written to (or forgotten) during the export may have rows and vectors that disagree.
+        """
+        if isinstance(session_ids, str):
+            session_ids = [session_ids]
+        session_ids = list(dict.fromkeys(session_ids))
+        os.makedirs(path, exist_ok=True)
+
+        # Read straight from the in-memory vector store, instead of searching with a dummy embedding.
+        # Only the array reference is taken here; the vectors themselves are copied in batches below.
+        wanted = set(session_ids)
+        state = self._vector_store_state()
+        positions = [ i for i, m in enumerate(state.metadata) if m.get('session_id') in wanted ]
+        records = [ {'id': state.unique_ids[i], 'metadata': state.metadata[i]} for i in positions ]
+        embedding_size = state.embedding_size or self.embedding_backend.embedding_size
+
+        # Index rebuilds normalize the stored array in place, so each batch is copied under the store lock
+        snapshot.write_vectors(
+            os.path.join(path, snapshot.VECTORS_FILE),
+            state.embeddings, positions, embedding_size, batch_size, lock=state.lock
+        )
+        vector_count = snapshot.write_records(os.path.join(path, snapshot.VECTOR_RECORDS_FILE), records)
+
+        columns = ['session_id', 'message_id', 'question', 'question_summary', 'answer', 'answer_summary', 'timestamp']
+
+        def iterate_rows(cursor):
+            # Keep the IN clause under SQLite's bound parameter limit
+            for start in range(0, len(session_ids), 500):
+                chunk = session_ids[start:start + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                cursor.execute(f'SELECT * FROM chat_sessions WHERE session_id IN ({placeholders})', chunk)
+                for row in cursor:
+                    yield dict(zip(columns, row))
+
+        with self.lock:
+            with sqlite3.connect(self.sqlite_db_path) as db_conn:
+                row_count = snapshot.write_records(
+                    os.path.join(path, snapshot.ROW_RECORDS_FILE),
+                    iterate_rows(db_conn.cursor())
+                )
+
+        snapshot.write_manifest(path, {
+            'version': snapshot.SNAPSHOT_VERSION,
+            'session_ids': session_ids,
+            'row_count': row_count,
+            'vector_count': vector_count,
+            'embedding_size': embedding_size
+        })
+
+        return row_count, vector_count
+
+    def import_snapshot(self, path, batch_size=5000):
+        """
+        Restores a snapshot created by `export_sessions`.
+
+        Vectors are re-attached as they were exported, so nothing is compressed or embedded again.
+        Rows that already exist are replaced, and vectors that already exist are skipped.
+        If the import fails, the vectors attached so far are removed and no row is written.
+        Returns the list of imported session ids.
+        """
+        manifest = snapshot.read_manifest(path)
+        vectors = snapshot.read_vectors(os.path.join(path, snapshot.VECTORS_FILE))
+        rows_path = os.path.join(path, snapshot.ROW_RECORDS_FILE)
+        records_path = os.path.join(path, snapshot.VECTOR_RECORDS_FILE)
+
+        # Validate up front, so a mismatching snapshot is rejected before anything is written
+        if vectors.ndim != 2 or vectors.shape[0] != manifest['vector_count'] or vectors.shape[1] != manifest['embedding_size']:
+            raise ValueError("Snapshot vector block does not match its manifest.")
+
+        if snapshot.count_records(records_path) != manifest['vector_count']:
+            raise ValueError("Snapshot vector records do not match its manifest.")
+
+        if snapshot.count_records(rows_path) != manifest['row_count']:
+            raise ValueError("Snapshot rows do not match its manifest.")
+
+        state = self._vector_store_state()
+        existing_ids = set(state.unique_ids)
+        expected_size = state.embedding_size or self.embedding_backend.embedding_size
+        if vectors.shape[0] > 0 and vectors.shape[1] != expected_size:
+            raise ValueError(f"Snapshot embedding size ({vectors.shape[1]}) does not match this memory ({expected_size}).")
+
+        columns = ['session_id', 'message_id', 'question', 'question_summary', 'answer', 'answer_summary', 'timestamp']
+
+        attached_ids = []
+        try:
+            # Vectors first, without holding the Memory lock, so other sessions keep working during the restore
+            offset = 0
+            for records in snapshot.read_records(records_path, batch_size):
+                block = vectors[offset:offset + len(records)]
+                offset += len(records)
+
+                keep = [ i for i, r in enumerate(records) if r['id'] not in existing_ids ]
+                if keep:
+                    ids = [ records[i]['id'] for i in keep ]
+                    self.vector_db.store_embeddings_batch(
+                        ids,
+                        [ block[i] for i in keep ],
+                        [ records[i]['metadata'] for i in keep ]
+                    )
+                    attached_ids.extend(ids)
+
+            # Then the rows, in a single short transaction (rolled back if anything fails)
+            with self.lock:
+                with sqlite3.connect(self.sqlite_db_path) as db_conn:
+                    cursor = db_conn.cursor()
+                    for rows in snapshot.read_records(rows_path, batch_size):
+                        cursor.executemany(f'''
+                            INSERT OR REPLACE INTO chat_sessions ({', '.join(columns)})
+                            VALUES ({', '.join('?' for _ in columns)})
+                        ''', [ tuple(row[c] for c in columns) for row in rows ])
+                    db_conn.commit()
+        except BaseException:
+            if attached_ids:
+                self.vector_db.delete_embeddings_batch(attached_ids)
+            raise
+
+        return manifest['session_ids']
@@ -2,7 +2,7 @@ import tiktoken, nltk, numpy as np, pickle, pkg_resources, fasttext, os
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.decomposition import LatentDirichletAllocation
 from sklearn.metrics.pairwise import cosine_similarity
-from memory.embeddings import extract_embeddings
+from memory.embeddings import get_embedding_backend
 from memory.log_util import log_exception
 from nltk.tokenize import sent_tokenize
 
@@ -43,7 +43,7 @@ def detect_language(text):
     detected_lang = langdetect_model.predict(text.replace('\n', ' '), k=1)[0][0]
     return 'pt' if (str(detected_lang) == '__label__pt' or str(detected_lang) == 'portuguese') else 'en'
 
-def semantic_compress_text(full_text, compression_rate=0.7, num_topics=5):
+def semantic_compress_text(full_text, compression_rate=0.7, num_topics=5, embedding_backend=None):
     def calculate_similarity(embed1, embed2):
         return cosine_similarity([embed1], [embed2])[0][0]
 
@@ -58,8 +58,7 @@ def semantic_compress_text(full_text, compression_rate=0.7, num_topics=5):
         vec = vectorizer.transform([text])
         return lda.transform(vec)[0]
 
-    def sentence_importance(sentence, doc_embedding, lda_model, vectorizer, stopwords):
-        sentence_embedding = extract_embeddings(sentence)
+    def sentence_importance(sentence, sentence_embedding, doc_embedding, lda_model, vectorizer, stopwords):
         semantic_similarity = calculate_similarity(doc_embedding, sentence_embedding)
         
         topic_dist = get_topic_distribution(sentence, lda_model, vectorizer)
@@ -88,12 +87,15 @@ def semantic_compress_text(full_text, compression_rate=0.7, num_topics=5):
         # Create LDA model
         lda_model, vectorizer = create_lda_model(sentences, portuguese_stopwords if text_lang == 'pt' else english_stopwords)
 
-        # Get document-level embedding
-        doc_embedding = extract_embeddings(full_text)
+        # Get the document-level embedding on its own, so the (short) sentences are not padded to its length
+        if embedding_backend is None:
+            embedding_backend = get_embedding_backend()
+        doc_embedding = embedding_backend.extract_embeddings(full_text)
+        sentence_embeddings = embedding_backend.extract_embeddings_batch(sentences)
 
         # Calculate importance for each sentence
-        sentence_scores = [(sentence, sentence_importance(sentence, doc_embedding, lda_model, vectorizer, portuguese_stopwords if text_lang == 'pt' else english_stopwords)) 
-                        for sentence in sentences]
+        sentence_scores = [(sentence, sentence_importance(sentence, sentence_embedding, doc_embedding, lda_model, vectorizer, portuguese_stopwords if text_lang == 'pt' else english_stopwords)) 
+                        for sentence, sentence_embedding in zip(sentences, sentence_embeddings)]
 
         # Sort sentences by importance
         sorted_sentences = sorted(sentence_scores, key=lambda x: x[1], reverse=True)
@@ -122,7 +124,7 @@ def semantic_compress_text(full_text, compression_rate=0.7, num_topics=5):
     
     return full_text
 
-def compress_text(text):
+def compress_text(text, embedding_backend=None):
     original_token_count = count_tokens_tiktoken(text)
 
     target_token_count = 500
@@ -133,4 +135,4 @@ def compress_text(text):
     # Get the compression rate
     compression_rate = target_token_count / original_token_count
 
-    return semantic_compress_text(text, compression_rate)
\ No newline at end of file
+    return semantic_compress_text(text, compression_rate, embedding_backend=embedding_backend)
\ No newline at end of file
@@ -1,6 +1,302 @@
 from minivectordb.embedding_model import EmbeddingModel
+from memory.log_util import log_exception
+from concurrent.futures import Future
+import multiprocessing, threading, weakref, queue, time, hashlib, re, os, numpy as np
 
-model = EmbeddingModel(onnx_model_cpu_core_count=1)
+class EmbeddingBackend:
+    """
+    Base interface for embedding backends.
+
+    Subclasses must implement `extract_embeddings_batch`, which receives a list of texts
+    and returns one embedding (of size `embedding_size`) per text, in the same order.
+    """
+    embedding_size = 512
+
+    def extract_embeddings_batch(self, texts):
+        raise NotImplementedError
+
+    def extract_embeddings(self, text):
+        return self.extract_embeddings_batch([text])[0]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Runs the quantized ONNX model from minivectordb in the current process.
+    Batches are split into chunks of at most `batch_size` texts per model run.
+    """
+    def __init__(self, onnx_model_cpu_core_count=1, batch_size=32):
+        self.model = EmbeddingModel(onnx_model_cpu_core_count=onnx_model_cpu_core_count)
+        self.batch_size = batch_size
+
+    def extract_embeddings_batch(self, texts):
+        texts = list(texts)
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            chunk = texts[start:start + self.batch_size]
+            embeddings.extend(self.model.model.run(output_names=["outputs"], input_feed={"inputs": chunk})[0])
+        return embeddings
+
+    def extract_embeddings(self, text):
+        return self.model.extract_embeddings(text)
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic, model-free stand-in that hashes words into a fixed size vector.
+    Useful for tests, since it loads nothing and always returns the same vector for the same text.
+    """
+    def __init__(self, embedding_size=512):
+        self.embedding_size = embedding_size
+
+    def _embed(self, text):
+        embedding = np.zeros(self.embedding_size, dtype=np.float32)
+        for token in re.findall(r'\w+', text.lower()):
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            embedding[value % self.embedding_size] += 1.0 if (value >> 63) & 1 else -1.0
+
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def extract_embeddings_batch(self, texts):
+        return [self._embed(text) for text in texts]
+
+def _embedding_worker(backend_factory, request_queue, result_queue, shm_name, slot_count, embedding_size, max_batch_size, max_latency):
+    from multiprocessing import shared_memory
+
+    try:
+        backend = backend_factory()
+    except Exception as e:
+        # Report the failure, so callers are not left waiting for a worker that never started
+        log_exception()
+        result_queue.put((None, repr(e)))
+        return
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results = np.ndarray((slot_count, embedding_size), dtype=np.float32, buffer=shm.buf)
+
+    try:
+        stop = False
+        while not stop:
+            request = request_queue.get()
+            if request is None:
+                break
+
+            # Coalesce whatever else arrives before the deadline into the same micro-batch
+            batch = [request]
+            deadline = time.monotonic() + max_latency
+            while len(batch) < max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = request_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            slots = [ slot for slot, _ in batch ]
+            try:
+                embeddings = backend.extract_embeddings_batch([ text for _, text in batch ])
+                for slot, embedding in zip(slots, embeddings):
+                    results[slot] = embedding
+                result_queue.put((slots, None))
+            except Exception as e:
+                log_exception()
+                result_queue.put((slots, repr(e)))
+    finally:
+        del results
+        shm.close()
+        backend.close()
+
+def _release_shared_memory(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A view on the buffer is still alive (interpreter shutdown), unlinking is what matters
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+class ProcessPoolEmbeddingBackend(EmbeddingBackend):
+    """
+    Runs `workers` model replicas in separate processes.
+
+    Requests go through a shared queue, and each worker coalesces them into micro-batches
+    of up to `max_batch_size` texts, waiting at most `max_latency` seconds for a batch to fill.
+    Embeddings are written into a shared memory buffer, so only slot numbers travel back.
+
+    If a worker fails to start or dies, every pending and future request fails with a RuntimeError.
+    The backend should be closed with `close()`, or used as a context manager.
+
+    Workers are started with the "spawn" method, so scripts creating this backend
+    must be guarded by `if __name__ == '__main__':`.
+
+    Args with defaults:
+    - backend_factory: Picklable callable that builds the backend each worker runs (ONNX, one core each).
+    - workers: Number of worker processes (defaults to the CPU count).
+    - max_batch_size: Maximum number of texts per micro-batch.
+    - max_latency: Maximum time (in seconds) a worker waits to fill a micro-batch.
+    - slot_count: Number of requests that can be in flight at once.
+    - embedding_size: Size of the embeddings returned by the backend.
+    """
+    liveness_check_interval = 0.5
+
+    def __init__(
+            self,
+            backend_factory = OnnxEmbeddingBackend,
+            workers: int = None,
+            max_batch_size: int = 32,
+            max_latency: float = 0.005,
+            slot_count: int = 1024,
+            embedding_size: int = 512
+        ):
+        from multiprocessing import shared_memory
+
+        self.embedding_size = embedding_size
+        self.slot_count = slot_count
+        self.workers = workers or os.cpu_count() or 1
+
+        context = multiprocessing.get_context('spawn')
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_count * embedding_size * 4)
+        self._finalizer = weakref.finalize(self, _release_shared_memory, self.shm)
+        self.results = np.ndarray((slot_count, embedding_size), dtype=np.float32, buffer=self.shm.buf)
+        self.request_queue = context.Queue()
+        self.result_queue = context.Queue()
+
+        self.free_slots = queue.Queue()
+        for slot in range(slot_count):
+            self.free_slots.put(slot)
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.error = None
+        self.closed = False
+
+        self.processes = [
+            context.Process(
+                target=_embedding_worker,
+                args=(backend_factory, self.request_queue, self.result_queue, self.shm.name,
+                      slot_count, embedding_size, max_batch_size, max_latency),
+                daemon=True
+            )
+            for _ in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+        self.collector = threading.Thread(target=self._collect_results, daemon=True)
+        self.collector.start()
+
+    def _fail_pending(self, error):
+        with self.pending_lock:
+            if self.error is None:
+                self.error = error
+            failed = list(self.pending.items())
+            self.pending.clear()
+
+        for slot, future in failed:
+            future.set_exception(RuntimeError(self.error))
+            self.free_slots.put(slot)
+
+    def _collect_results(self):
+        while True:
+            try:
+                message = self.result_queue.get(timeout=self.liveness_check_interval)
+            except queue.Empty:
+                message = ()
+
+            if message is None:
+                break
+
+            if message:
+                slots, error = message
+                if slots is None:
+                    self._fail_pending(f"Embedding worker failed to start: {error}")
+                else:
+                    for slot in slots:
+                        with self.pending_lock:
+                            future = self.pending.pop(slot, None)
+                        if future is None:
+                            # Already failed (and its slot released) after a worker died
+                            continue
+
+                        if error is None:
+                            future.set_result(self.results[slot].copy())
+                        else:
+                            future.set_exception(RuntimeError(f"Embedding worker failed: {error}"))
+
+                        # The vector was copied out, so the slot can be reused right away
+                        self.free_slots.put(slot)
+
+            # Requests taken by a dead worker would never be answered
+            if not self.closed and any(not process.is_alive() for process in self.processes):
+                self._fail_pending("An embedding worker process died.")
+
+    def _submit(self, text):
+        slot = self.free_slots.get()
+        future = Future()
+        with self.pending_lock:
+            if self.error is not None:
+                self.free_slots.put(slot)
+                raise RuntimeError(self.error)
+            self.pending[slot] = future
+        self.request_queue.put((slot, text))
+        return future
+
+    def extract_embeddings_batch(self, texts):
+        futures = [ self._submit(text) for text in texts ]
+        return [ future.result() for future in futures ]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        for process in self.processes:
+            if process.is_alive():
+                self.request_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+        self.result_queue.put(None)
+        self.collector.join()
+        self._fail_pending("The embedding backend was closed.")
+
+        self.results = None
+        self._finalizer()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def set_embedding_backend(backend: EmbeddingBackend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def get_embedding_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = OnnxEmbeddingBackend()
+        return _backend
 
 def extract_embeddings(text):
-    return model.extract_embeddings(text)
+    return get_embedding_backend().extract_embeddings(text)
+
+def extract_embeddings_batch(texts):
+    return get_embedding_backend().extract_embeddings_batch(texts)
@@ -0,0 +1,78 @@
+from numpy.lib.format import open_memmap
+import os, json, gzip, numpy as np
+
+SNAPSHOT_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.npy'
+VECTOR_RECORDS_FILE = 'vectors.jsonl.gz'
+ROW_RECORDS_FILE = 'rows.jsonl.gz'
+
+def write_manifest(path, manifest):
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+
+    return manifest
+
+def write_records(file_path, records):
+    """
+    Streams an iterable of dicts into a gzip-compressed JSON lines file.
+    Returns the number of records written.
+    """
+    count = 0
+    with gzip.open(file_path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, default=str))
+            f.write('\n')
+            count += 1
+    return count
+
+def read_records(file_path, batch_size=5000):
+    """
+    Yields the records of a gzip-compressed JSON lines file in lists of at most `batch_size`.
+    """
+    batch = []
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def count_records(file_path):
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+def write_vectors(file_path, source, positions, embedding_size, batch_size=5000, lock=None):
+    """
+    Copies the rows of `source` at `positions` into an .npy file, one batch at a time,
+    so the exported block is never held in memory as a whole.
+    If a lock is given, it is held only while each batch is copied out of `source`.
+    """
+    if len(positions) == 0:
+        np.save(file_path, np.zeros((0, embedding_size), dtype=np.float32))
+        return
+
+    vectors = open_memmap(file_path, mode='w+', dtype=np.float32, shape=(len(positions), embedding_size))
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        if lock is None:
+            block = source[chunk]
+        else:
+            with lock:
+                block = source[chunk]
+        vectors[start:start + len(chunk)] = block
+    vectors.flush()
+    del vectors
+
+def read_vectors(file_path):
+    return np.load(file_path, mmap_mode='r')
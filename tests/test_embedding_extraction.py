@@ -1,7 +1,82 @@
-from memory.embeddings import extract_embeddings
+from memory.embeddings import extract_embeddings, OnnxEmbeddingBackend, HashEmbeddingBackend, ProcessPoolEmbeddingBackend
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np, pytest, time
 
 text = "Hello, world!"
 
 def test_extract_embeddings():
     result = extract_embeddings(text)
     assert len(result) == 512
+
+class SlowHashEmbeddingBackend(HashEmbeddingBackend):
+    def extract_embeddings_batch(self, texts):
+        time.sleep(0.5)
+        return super().extract_embeddings_batch(texts)
+
+def failing_backend_factory():
+    raise RuntimeError("Model could not be loaded")
+
+def test_onnx_batch_matches_single_extraction():
+    texts = [text, "The capital of Brazil is Brasília.", "A much longer sentence, written only to check that padding inside a batch does not change the result."]
+    # A small batch size also covers splitting the batch into several model runs
+    backend = OnnxEmbeddingBackend(batch_size=2)
+    batch = backend.extract_embeddings_batch(texts)
+    assert len(batch) == len(texts)
+    for embedding, single_text in zip(batch, texts):
+        assert np.allclose(embedding, backend.extract_embeddings(single_text), atol=1e-5)
+
+def test_hash_embedding_backend_is_deterministic():
+    backend = HashEmbeddingBackend()
+    first, second, other = backend.extract_embeddings_batch([text, text, "Something else entirely"])
+    assert len(first) == 512
+    assert np.allclose(first, second)
+    assert not np.allclose(first, other)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+def test_process_pool_embedding_backend():
+    texts = [f"Sentence number {i}" for i in range(50)]
+    backend = ProcessPoolEmbeddingBackend(backend_factory=HashEmbeddingBackend, workers=2, slot_count=8)
+    try:
+        results = backend.extract_embeddings_batch(texts)
+        assert len(results) == len(texts)
+
+        expected = HashEmbeddingBackend().extract_embeddings_batch(texts)
+        for result, expected_result in zip(results, expected):
+            assert np.allclose(result, expected_result)
+
+        assert np.allclose(backend.extract_embeddings(text), HashEmbeddingBackend().extract_embeddings(text))
+    finally:
+        backend.close()
+
+def test_process_pool_embedding_backend_reports_worker_failure():
+    with ProcessPoolEmbeddingBackend(backend_factory=failing_backend_factory, workers=1) as backend:
+        with pytest.raises(RuntimeError):
+            backend.extract_embeddings(text)
+
+        # Once failed, new requests fail right away
+        with pytest.raises(RuntimeError):
+            backend.extract_embeddings(text)
+
+def test_process_pool_embedding_backend_close_is_idempotent():
+    backend = ProcessPoolEmbeddingBackend(backend_factory=HashEmbeddingBackend, workers=1)
+    backend.close()
+    backend.close()
+
+    with pytest.raises(RuntimeError):
+        backend.extract_embeddings(text)
+
+def test_process_pool_embedding_backend_fails_requests_of_a_killed_worker():
+    with ProcessPoolEmbeddingBackend(backend_factory=SlowHashEmbeddingBackend, workers=1, max_batch_size=1) as backend:
+        # Make sure the worker is up before killing it mid-request
+        backend.extract_embeddings(text)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            in_flight = executor.submit(backend.extract_embeddings_batch, [text] * 10)
+            time.sleep(0.2)
+            backend.processes[0].kill()
+
+            with pytest.raises(RuntimeError, match="died"):
+                in_flight.result(timeout=10)
+
+        with pytest.raises(RuntimeError):
+            backend.extract_embeddings(text)
@@ -1,8 +1,9 @@
-from memory.embeddings import extract_embeddings
+from memory.embeddings import extract_embeddings, HashEmbeddingBackend
 from memory.compression import compress_text
 from contextlib import contextmanager
 from memory.brain import Memory
-import shutil, os, numpy as np
+from datetime import datetime
+import shutil, os, gzip, json, pytest, numpy as np
 
 @contextmanager
 def get_memory_object():
@@ -47,6 +48,18 @@ def test_memorize_and_retrieve():
         assert interactions[0]['answer'] == "Test answer"
         assert interactions[1]['question'] == "Test question"
 
+def test_memorize_and_remember_with_custom_backend():
+    memory = Memory(sqlite_db_path='./hash_memory.db', vector_db_storage_folder_location='hash_memory_shards', embedding_backend=HashEmbeddingBackend())
+    try:
+        session_id, _, _ = memory.memorize("What is the capital of Italy?", "The capital of Italy is Rome.")
+        memory.memorize("What is the capital of Brazil?", "The capital of Brazil is Brasília.", session_id)
+
+        retrieved_memory = memory.remember(session_id, "What is the capital of Italy?", recent_interaction_count=0)
+        assert retrieved_memory['context_memory'][0]['sentence'] == "What is the capital of Italy?"
+    finally:
+        os.remove(memory.sqlite_db_path)
+        shutil.rmtree(memory.vector_db_storage_folder_location)
+
 # Test for embedding extraction
 def test_extract_embeddings():
     with get_memory_object() as memory:
@@ -172,4 +185,157 @@ def test_multiple_sessions_ensure_no_interference():
         assert 'italy' not in retrieved_memory['suggested_context'].lower()
         assert 'france' not in retrieved_memory['suggested_context'].lower()
         assert 'spain' not in retrieved_memory['suggested_context'].lower()
-        
\ No newline at end of file
+        
+def test_search_parallel_partitions_match_brute_force():
+    memory = Memory(sqlite_db_path='./hash_memory.db', vector_db_storage_folder_location='hash_memory_shards', embedding_backend=HashEmbeddingBackend())
+    try:
+        # Enough vectors for several partitions, so the thread pool and the heap merge are exercised
+        count = 5000
+        rng = np.random.default_rng(42)
+        vectors = rng.standard_normal((count, 512)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        metadatas = [
+            {
+                'sentence': f'sentence {i}',
+                'session_id': f'session-{i % 10}',
+                'message_id': f'message-{i}',
+                'type': 'question' if i % 2 == 0 else 'answer'
+            }
+            for i in range(count)
+        ]
+        memory.vector_db.store_embeddings_batch([ f'id-{i}' for i in range(count) ], list(vectors), metadatas)
+
+        query = "capital of Brazil"
+        query_embedding = HashEmbeddingBackend().extract_embeddings(query)
+        scores = vectors @ query_embedding
+
+        def brute_force(predicate, k):
+            candidates = [ i for i in range(count) if predicate(metadatas[i]) ]
+            best = sorted(candidates, key=lambda i: -scores[i])[:k]
+            return [ metadatas[i]['message_id'] for i in best ]
+
+        results = memory.search(query, k=10, workers=4)
+        assert [ r['message_id'] for r in results ] == brute_force(lambda m: True, 10)
+
+        scope = ['session-1', 'session-3']
+        results = memory.search(query, scope=scope, types='answer', k=10, workers=4)
+        assert [ r['message_id'] for r in results ] == brute_force(lambda m: m['session_id'] in scope and m['type'] == 'answer', 10)
+
+        results = memory.search(query, types='question', k=25, workers=4)
+        assert [ r['message_id'] for r in results ] == brute_force(lambda m: m['type'] == 'question', 25)
+    finally:
+        os.remove(memory.sqlite_db_path)
+        shutil.rmtree(memory.vector_db_storage_folder_location)
+
+def test_export_and_import_snapshot():
+    with get_memory_object() as memory:
+        session_1, _, _ = memory.memorize("What is the capital of Italy?", "The capital of Italy is Rome.")
+        memory.memorize("What is the capital of Brazil?", "The capital of Brazil is Brasília.", session_1)
+        session_2, _, _ = memory.memorize("Hello, my name is Jane Doe", "Hi there Jane! How can I help you?")
+
+        row_count, vector_count = memory.export_sessions([session_1], 'memory_snapshot')
+        assert row_count == 4
+        assert vector_count > 0
+
+        restored = Memory(sqlite_db_path='./restored_memory.db', vector_db_storage_folder_location='restored_memory_shards')
+        try:
+            imported_sessions = restored.import_snapshot('memory_snapshot')
+            assert imported_sessions == [session_1]
+
+            assert restored.list_messages(session_1, count=True) == 4
+            assert restored.list_messages(session_2, count=True) == 0
+
+            retrieved_memory = restored.remember(session_1, "Capital of Brazil ?", recent_interaction_count=0)
+            assert 'brasília' in retrieved_memory['suggested_context'].lower()
+
+            # Importing twice does not duplicate anything
+            restored.import_snapshot('memory_snapshot')
+            assert restored.list_messages(session_1, count=True) == 4
+        finally:
+            os.remove(restored.sqlite_db_path)
+            shutil.rmtree(restored.vector_db_storage_folder_location)
+            shutil.rmtree('memory_snapshot')
+
+def test_search_across_sessions():
+    with get_memory_object() as memory:
+        session_1, _, _ = memory.memorize("What is the capital of Italy?", "The capital of Italy is Rome.")
+        session_2, _, _ = memory.memorize("What is the capital of Brazil?", "The capital of Brazil is Brasília.")
+        memory.memorize("What is the capital of France?", "The capital of France is Paris.", session_2)
+
+        results = memory.search("Capital of Brazil ?", k=2)
+        assert len(results) == 2
+        assert all(r['session_id'] == session_2 for r in results)
+        assert results[0]['score'] >= results[1]['score']
+        assert results[0]['message']['message_id'] == results[0]['message_id']
+
+        # Scope and type filters
+        results = memory.search("Capital of Brazil ?", scope=session_1, types='answer', k=5)
+        assert [ r['sentence'] for r in results ] == ["The capital of Italy is Rome."]
+
+        # Time range filters
+        assert memory.search("Capital of Brazil ?", start_time=datetime(2100, 1, 1)) == []
+        assert len(memory.search("Capital", end_time=datetime(2100, 1, 1), k=10)) == 6
+
+        # ISO 8601 strings match the same range as datetimes
+        start_time = datetime(2000, 1, 1)
+        assert len(memory.search("Capital", start_time=start_time.isoformat(), k=10)) == 6
+        assert len(memory.search("Capital", start_time=start_time, k=10)) == 6
+
+        with pytest.raises(TypeError):
+            memory.search("Capital", start_time=1700000000)
+
+def test_import_snapshot_with_mismatching_embedding_size():
+    memory = Memory(sqlite_db_path='./hash_memory.db', vector_db_storage_folder_location='hash_memory_shards', embedding_backend=HashEmbeddingBackend())
+    restored = Memory(sqlite_db_path='./restored_memory.db', vector_db_storage_folder_location='restored_memory_shards', embedding_backend=HashEmbeddingBackend(embedding_size=64))
+    try:
+        session_id, _, _ = memory.memorize("What is the capital of Italy?", "The capital of Italy is Rome.")
+        memory.export_sessions([session_id], 'memory_snapshot')
+
+        with pytest.raises(ValueError):
+            restored.import_snapshot('memory_snapshot')
+
+        # Nothing was written
+        assert restored.list_messages(session_id, count=True) == 0
+    finally:
+        for m in (memory, restored):
+            os.remove(m.sqlite_db_path)
+            shutil.rmtree(m.vector_db_storage_folder_location)
+        shutil.rmtree('memory_snapshot')
+
+def test_failed_import_snapshot_leaves_nothing_behind():
+    memory = Memory(sqlite_db_path='./hash_memory.db', vector_db_storage_folder_location='hash_memory_shards', embedding_backend=HashEmbeddingBackend())
+    restored = Memory(sqlite_db_path='./restored_memory.db', vector_db_storage_folder_location='restored_memory_shards', embedding_backend=HashEmbeddingBackend())
+    try:
+        session_id, _, _ = memory.memorize("What is the capital of Italy?", "The capital of Italy is Rome.")
+        memory.export_sessions([session_id], 'memory_snapshot')
+
+        vector_records_path = os.path.join('memory_snapshot', 'vectors.jsonl.gz')
+        rows_path = os.path.join('memory_snapshot', 'rows.jsonl.gz')
+        with gzip.open(vector_records_path, 'rt', encoding='utf-8') as f:
+            vector_lines = f.readlines()
+        with gzip.open(rows_path, 'rt', encoding='utf-8') as f:
+            row_lines = f.readlines()
+
+        # One vector record too many is rejected before anything is written
+        with gzip.open(vector_records_path, 'wt', encoding='utf-8') as f:
+            f.writelines(vector_lines + vector_lines[-1:])
+        with pytest.raises(ValueError):
+            restored.import_snapshot('memory_snapshot', batch_size=1)
+
+        # A row that fails after the vectors were attached removes those vectors again
+        with gzip.open(vector_records_path, 'wt', encoding='utf-8') as f:
+            f.writelines(vector_lines)
+        broken_row = json.loads(row_lines[-1])
+        del broken_row['timestamp']
+        with gzip.open(rows_path, 'wt', encoding='utf-8') as f:
+            f.writelines(row_lines[:-1] + [json.dumps(broken_row) + '\n'])
+        with pytest.raises(KeyError):
+            restored.import_snapshot('memory_snapshot', batch_size=1)
+
+        assert restored.list_messages(session_id, count=True) == 0
+        assert restored.search("capital of Italy", scope=session_id) == []
+    finally:
+        for m in (memory, restored):
+            os.remove(m.sqlite_db_path)
+            shutil.rmtree(m.vector_db_storage_folder_location)
+        shutil.rmtree('memory_snapshot')